@@ -1,18 +1,81 @@
 from flask import Flask, render_template, request, redirect, url_for, send_from_directory
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
+import hashlib
 import os
+import shutil
+import tempfile
 import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from huffman import HuffmanCoding
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 13 * 1024 * 1024  # 15MB max upload
+# Cap in-RAM buffering of non-file multipart fields (Flask 3.1+); file
+# parts always spool to temp files regardless.
+app.config['MAX_FORM_MEMORY_SIZE'] = 1 * 1024 * 1024
+# Let a fronting nginx/apache stream downloads via X-Sendfile instead of
+# pushing the bytes through the WSGI worker. Opt-in: the dev server has
+# nothing to honor the header.
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '') == '1'
 
 UPLOAD_FOLDER = "uploads"
 PROCESSED_FOLDER = "processed"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+# (filename, content digest) -> zip name already in PROCESSED_FOLDER, so
+# re-uploading the same file skips the whole compression pipeline.
+RESULT_CACHE = {}
+
+# The Huffman pipeline is CPU-bound; running it in worker processes keeps
+# the request threads (and the GIL) free for concurrent traffic. Workers
+# warm their JIT caches once and reuse them across requests.
+EXECUTOR = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+def _compress_path(file_path):
+    return HuffmanCoding(file_path).compress_to_bytes()
+
+
+def _decompress_path(file_path):
+    return HuffmanCoding(file_path).decompress()
+
+def _spool_upload(file):
+    """Stream one uploaded part to a temp file; return (name, path, size)."""
+    fd, path = tempfile.mkstemp(dir=UPLOAD_FOLDER)
+    size = 0
+    with os.fdopen(fd, 'wb') as tmp:
+        while True:
+            chunk = file.stream.read(1 << 20)
+            if not chunk:
+                break
+            tmp.write(chunk)
+            size += len(chunk)
+    return file.filename, path, size
+
+
+def _append_file(out_file, src_path, size):
+    """Concatenate src_path onto out_file, zero-copy via sendfile when the
+    platform allows it."""
+    with open(src_path, 'rb') as src:
+        out_file.flush()
+        sent = 0
+        try:
+            # sendfile may transfer fewer bytes than asked; loop until done.
+            while sent < size:
+                n = os.sendfile(out_file.fileno(), src.fileno(), sent, size - sent)
+                if n == 0:
+                    break
+                sent += n
+        except OSError:
+            pass
+        if sent < size:
+            # Resume from where sendfile stopped so nothing is duplicated.
+            src.seek(sent)
+            shutil.copyfileobj(src, out_file, length=1 << 20)
+
+
 @app.route('/')
 def index():
     return render_template('index1.html')
@@ -29,39 +92,60 @@ def compress():
     if not files or all(file.filename == '' for file in files):
         return redirect(url_for('index'))
 
+    cache_key = None
     if len(files) == 1:
         file = files[0]
         file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(file_path)
+        hasher = hashlib.blake2b()
+        with open(file_path, 'wb') as f:
+            while True:
+                chunk = file.stream.read(1 << 20)
+                if not chunk:
+                    break
+                f.write(chunk)
+                hasher.update(chunk)
+        cache_key = (file.filename, hasher.digest())
+        cached_zip = RESULT_CACHE.get(cache_key)
+        if cached_zip and os.path.exists(os.path.join(PROCESSED_FOLDER, cached_zip)):
+            return redirect(url_for('success', file=cached_zip, action="compressed"))
     else:
         combined_filename = "combined_input.txt"
         file_path = os.path.join(UPLOAD_FOLDER, combined_filename)
-        with open(file_path, 'w', encoding='utf-8') as combined:
-            for file in files:
-                filename = file.filename
-                content = file.read().decode('utf-8', errors='ignore')
-                combined.write(f"\n--- Start of {filename} ---\n")
-                combined.write(content)
-                combined.write(f"\n--- End of {filename} ---\n")
+        # Spool the parts to temp files in parallel, then splice them into
+        # the combined file kernel-side with byte delimiters in between.
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            spooled = list(executor.map(_spool_upload, files))
+        with open(file_path, 'wb') as combined:
+            for filename, tmp_path, size in spooled:
+                combined.write(f"\n--- Start of {filename} ---\n".encode('utf-8'))
+                _append_file(combined, tmp_path, size)
+                combined.write(f"\n--- End of {filename} ---\n".encode('utf-8'))
+                os.remove(tmp_path)
 
     print(f"Compressing file: {file_path}")  # Debug print
 
     try:
-        h = HuffmanCoding(file_path)
-        compressed_file_path = h.compress()
+        payload = EXECUTOR.submit(_compress_path, file_path).result()
     except Exception as e:
         print(f"Compression error: {e}")
         return render_template('error.html', message=f"Compression failed: {e}")
 
-    if compressed_file_path:
-        zip_filename = os.path.basename(compressed_file_path) + ".zip"
+    if payload:
+        bin_name = os.path.basename(file_path) + ".bin"
+        zip_filename = bin_name + ".zip"
         zip_path = os.path.join(PROCESSED_FOLDER, zip_filename)
         try:
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.write(compressed_file_path, arcname=os.path.basename(compressed_file_path))
+            # Write the payload straight into the zip: no intermediate .bin
+            # file on disk and no second pass over the compressed bytes.
+            # ZIP_STORED: the payload is already entropy-coded, so DEFLATE
+            # would burn a CPU pass for ~0% shrink.
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
+                zipf.writestr(bin_name, payload)
         except Exception as e:
             print(f"ZIP creation error: {e}")
             return render_template('error.html', message=f"ZIP creation failed: {e}")
+        if cache_key:
+            RESULT_CACHE[cache_key] = zip_filename
         return redirect(url_for('success', file=zip_filename, action="compressed"))
     else:
         return render_template('error.html', message="Compression failed.")
@@ -77,7 +161,8 @@ def decompress():
         return render_template('error.html', message="No selected file.")
 
     file_path = os.path.join(UPLOAD_FOLDER, secure_filename(file.filename))
-    file.save(file_path)
+    with open(file_path, 'wb') as f:
+        shutil.copyfileobj(file.stream, f, length=1 << 20)
 
     extracted_file_path = None
 
@@ -104,8 +189,8 @@ def decompress():
         print(f"Decompressing file: {extracted_file_path}")
 
         try:
-            h = HuffmanCoding(extracted_file_path)
-            decompressed_file = h.decompress()
+            decompressed_file = EXECUTOR.submit(
+                _decompress_path, extracted_file_path).result()
             print(f"Decompressed File Path: {decompressed_file}")
         except Exception as e:
             return render_template('error.html', message=f"Decompression failed: {e}")
@@ -136,7 +221,9 @@ def success():
 
 @app.route('/download/<filename>')
 def download(filename):
-    return send_from_directory(PROCESSED_FOLDER, filename, as_attachment=True)
+    # conditional=True serves 304s (and ranges) for repeated downloads.
+    return send_from_directory(PROCESSED_FOLDER, filename,
+                               as_attachment=True, conditional=True)
 
 @app.errorhandler(RequestEntityTooLarge)
 
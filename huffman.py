@@ -1,11 +1,33 @@
+import hashlib
 import heapq
-import pickle
+import math
+import struct
+from functools import lru_cache
 import numpy as np
-from collections import defaultdict
 from PIL import Image
 import docx
 import os
 
+from huffman_kernels import pack_bits, decode_bits, decode_lut
+
+MAGIC = b'HUF2'
+# Fixed-size part of the .bin header that follows the magic + mode + type
+# tag: padding, original symbol count, image shape (zeros for text), table
+# size.
+HEADER_FORMAT = '<BQIIII'
+
+MODE_HUFFMAN = 0
+MODE_STORED = 1  # payload kept verbatim, no code table
+
+# Above this many bits/symbol the input is essentially incompressible and
+# Huffman coding only adds table overhead.
+STORED_ENTROPY_THRESHOLD = 7.5
+
+# Cap on code lengths (as in DEFLATE): bounds the flat decode table at
+# 2^15 entries. Alphabets larger than 2^15 symbols cannot honor the cap
+# and fall back to the tree-walking decoder.
+MAX_CODE_LENGTH = 15
+
 try:
     import PyPDF2
 except ImportError:
@@ -14,6 +36,8 @@ except ImportError:
 
 class HuffmanCoding:
     class Node:
+        __slots__ = ('symbol', 'freq', 'left', 'right')
+
         def __init__(self, symbol, freq):
             self.symbol = symbol
             self.freq = freq
@@ -26,97 +50,272 @@ class HuffmanCoding:
     def __init__(self, file_path):
         self.file_path = file_path
         self.file_type = os.path.splitext(file_path)[1].lower().replace('.', '')
-        self.heap = []
         self.codes = {}
         self.reverse_mapping = {}
 
     # ---------- Common Huffman Logic ----------
     def _build_frequency_dict(self, data):
-        freq = defaultdict(int)
         if self.file_type in ['jpg', 'jpeg', 'png','bmp']:
-            for pixel in map(tuple, data):  # pixels
-                freq[pixel] += 1
+            # Pixels arrive already packed as uint32; one np.unique pass
+            # counts them all in vectorized C.
+            values, counts = np.unique(data, return_counts=True)
+            return {int(v): int(c) for v, c in zip(values, counts)}
         else:
-            for char in data:  # text
-                freq[char] += 1
-        return freq
-
-    def _build_heap(self, freq_dict):
-        for symbol, freq in freq_dict.items():
-            heapq.heappush(self.heap, self.Node(symbol, freq))
-
-    def _merge_nodes(self):
-        while len(self.heap) > 1:
-            node1 = heapq.heappop(self.heap)
-            node2 = heapq.heappop(self.heap)
-            merged = self.Node(None, node1.freq + node2.freq)
+            # Byte alphabet: one bincount pass over a uint8 view.
+            counts = np.bincount(np.frombuffer(data, dtype=np.uint8),
+                                 minlength=256)
+            return {i: int(c) for i, c in enumerate(counts) if c}
+
+    @staticmethod
+    def _code_lengths_from_frequencies(freq_items):
+        # heapify is O(N) in C; N pushes would be O(N log N).
+        heap = [HuffmanCoding.Node(symbol, freq) for symbol, freq in freq_items]
+        heapq.heapify(heap)
+        while len(heap) > 1:
+            node1 = heapq.heappop(heap)
+            node2 = heapq.heappop(heap)
+            merged = HuffmanCoding.Node(None, node1.freq + node2.freq)
             merged.left = node1
             merged.right = node2
-            heapq.heappush(self.heap, merged)
-
-    def _build_codes_helper(self, node, code=""):
-        if node:
+            heapq.heappush(heap, merged)
+        # Explicit stack instead of recursion: no per-node call frames and
+        # no recursion-limit risk on heavily skewed trees.
+        lengths = {}
+        stack = [(heap[0], 0)]
+        while stack:
+            node, depth = stack.pop()
             if node.symbol is not None:
-                self.codes[node.symbol] = code
-                self.reverse_mapping[code] = node.symbol
-            self._build_codes_helper(node.left, code + "0")
-            self._build_codes_helper(node.right, code + "1")
-
-    def _build_codes(self):
-        root = heapq.heappop(self.heap)
-        self._build_codes_helper(root)
-
-    def _get_encoded_data(self, data):
+                lengths[node.symbol] = depth or 1
+            else:
+                stack.append((node.right, depth + 1))
+                stack.append((node.left, depth + 1))
+        return tuple(sorted(lengths.items()))
+
+    @staticmethod
+    def _limit_code_lengths(length_items, max_length):
+        # Length-limit the code (DEFLATE-style): clamp everything to the
+        # cap, then restore the Kraft inequality by lengthening the deepest
+        # codes still below it — the cheapest corrections first.
+        if len(length_items) > (1 << max_length):
+            return length_items  # cap unattainable for this alphabet
+        if max(length for _, length in length_items) <= max_length:
+            return length_items
+        lengths = {s: min(l, max_length) for s, l in length_items}
+        budget = 1 << max_length
+        kraft = sum(budget >> l for l in lengths.values())
+        while kraft > budget:
+            symbol = max((s for s, l in lengths.items() if l < max_length),
+                         key=lambda s: lengths[s])
+            kraft -= budget >> (lengths[symbol] + 1)
+            lengths[symbol] += 1
+        return tuple(sorted(lengths.items()))
+
+    def _build_codes(self, freq_dict, data_digest):
+        freq_items = tuple(sorted(freq_dict.items()))
+        self.code_lengths = dict(_cached_code_lengths(data_digest, freq_items))
+        self.codes, self.reverse_mapping = self._canonical_codes(self.code_lengths)
+        self._build_code_arrays()
+
+    def _build_code_arrays(self):
+        # Dense integer tables for the hot encode path; the {symbol: bits}
+        # dict is kept only for the pure-Python decode fallback.
+        items = sorted(self.codes.items())
         if self.file_type in ['jpg', 'jpeg', 'png','bmp']:
-            return "".join(self.codes[tuple(pixel)] for pixel in data)
+            self.symbol_keys = np.array([s for s, _ in items], dtype=np.uint32)
+            self.code_val = np.array([int(c, 2) for _, c in items], dtype=np.int64)
+            self.code_len = np.array([len(c) for _, c in items], dtype=np.int32)
         else:
-            return "".join(self.codes[char] for char in data)
-
-    def _pad_encoded_data(self, encoded_data):
-        extra_padding = 8 - len(encoded_data) % 8
-        padded_info = "{0:08b}".format(extra_padding)
-        return padded_info + encoded_data + "0" * extra_padding, extra_padding
-
-    def _get_byte_array(self, padded_data):
-        return bytearray(int(padded_data[i:i + 8], 2) for i in range(0, len(padded_data), 8))
-
-    def _remove_padding(self, padded_data):
-        padding = int(padded_data[:8], 2)
-        return padded_data[8:-padding]
+            # Byte alphabet: index directly by byte value, no LUT hop.
+            self.symbol_keys = None
+            self.code_val = np.zeros(256, dtype=np.int64)
+            self.code_len = np.zeros(256, dtype=np.int32)
+            for symbol, code in items:
+                self.code_val[symbol] = int(code, 2)
+                self.code_len[symbol] = len(code)
+
+    def _canonical_codes(self, code_lengths):
+        # Assign canonical codes: symbols sorted by (length, symbol) get
+        # consecutive code values, so code lengths alone fully determine the
+        # code book and are all the header needs to carry.
+        codes = {}
+        reverse_mapping = {}
+        code = 0
+        prev_length = 0
+        for symbol, length in sorted(code_lengths.items(),
+                                     key=lambda item: (item[1], item[0])):
+            code <<= length - prev_length
+            prev_length = length
+            bits = format(code, '0{}b'.format(length))
+            codes[symbol] = bits
+            reverse_mapping[bits] = symbol
+            code += 1
+        return codes, reverse_mapping
+
+    def _symbol_indices(self, data):
+        # Map the input stream to indices into the precomputed code arrays.
+        if self.file_type in ['jpg', 'jpeg', 'png','bmp']:
+            return np.searchsorted(self.symbol_keys, data)
+        else:
+            # code_val/code_len are dense over all 256 byte values, so the
+            # bytes themselves are the indices.
+            return np.frombuffer(data, dtype=np.uint8)
 
-    def _decode_data(self, bit_string):
-        current_code = ""
+    def _get_encoded_data(self, data):
+        # Encode via the precomputed (value, length) integer tables and
+        # bitwise assembly; no dict lookups in the hot path.
+        idx = self._symbol_indices(data).astype(np.int64)
+
+        if pack_bits is not None:
+            total_bits = int(self.code_len[idx].sum())
+            out = np.zeros((total_bits + 7) // 8, dtype=np.uint8)
+            pack_bits(idx, self.code_val, self.code_len, out)
+            return bytearray(out), (8 - total_bits % 8) % 8
+
+        byte_array = bytearray()
+        register = 0
+        nbits = 0
+        for value, length in zip(self.code_val[idx].tolist(),
+                                 self.code_len[idx].tolist()):
+            register = (register << length) | value
+            nbits += length
+            while nbits >= 8:
+                nbits -= 8
+                byte_array.append((register >> nbits) & 0xff)
+                register &= (1 << nbits) - 1
+        padding = 0
+        if nbits:
+            padding = 8 - nbits
+            byte_array.append((register << padding) & 0xff)
+        return byte_array, padding
+
+    def _decode_table_for(self, state):
+        # Lazily build, for a given partial-code state, the 256-entry table
+        # mapping a whole input byte to (symbols decoded, next state).
+        table = self._decode_tables.get(state)
+        if table is None:
+            table = []
+            for byte in range(256):
+                symbols = []
+                code = state
+                for i in range(7, -1, -1):
+                    code += '1' if (byte >> i) & 1 else '0'
+                    if code in self.reverse_mapping:
+                        symbols.append(self.reverse_mapping[code])
+                        code = ""
+                table.append((symbols, code))
+            self._decode_tables[state] = table
+        return table
+
+    def _build_decode_lut(self):
+        # Flat table: every max_len-bit window maps to (symbol index, code
+        # length), so decoding is a single lookup per code word. Each code
+        # fills the 2^(max_len - length) slots sharing its prefix.
+        max_len = max(self.code_lengths.values())
+        lut_symbol = np.zeros(1 << max_len, dtype=np.int32)
+        lut_length = np.ones(1 << max_len, dtype=np.int32)
+        symbols = []
+        for symbol, code in sorted(self.codes.items()):
+            span = 1 << (max_len - len(code))
+            start = int(code, 2) << (max_len - len(code))
+            lut_symbol[start:start + span] = len(symbols)
+            lut_length[start:start + span] = len(code)
+            symbols.append(symbol)
+        return lut_symbol, lut_length, max_len, symbols
+
+    def _build_tree_arrays(self):
+        # Flatten reverse_mapping into array-of-children form (left/right
+        # child index per node, -1 when absent) for the compiled decoder.
+        left, right, symbol_idx = [-1], [-1], [-1]
+        symbols = []
+        for code, symbol in self.reverse_mapping.items():
+            node = 0
+            for bit in code:
+                children = right if bit == '1' else left
+                if children[node] == -1:
+                    children[node] = len(left)
+                    left.append(-1)
+                    right.append(-1)
+                    symbol_idx.append(-1)
+                node = children[node]
+            symbol_idx[node] = len(symbols)
+            symbols.append(symbol)
+        return (np.array(left, dtype=np.int32),
+                np.array(right, dtype=np.int32),
+                np.array(symbol_idx, dtype=np.int32),
+                symbols)
+
+    def _decode_data(self, byte_array, padding, count=None):
+        if (decode_lut is not None and count is not None
+                and max(self.code_lengths.values()) <= MAX_CODE_LENGTH):
+            lut_symbol, lut_length, max_len, symbols = self._build_decode_lut()
+            buf = np.frombuffer(byte_array, dtype=np.uint8)
+            out = np.empty(count, dtype=np.int32)
+            decode_lut(buf, lut_symbol, lut_length, max_len, out)
+            # One fancy-indexing pass from symbol indices to symbol values;
+            # no per-element Python objects on the way out.
+            return np.asarray(symbols, dtype=np.uint32)[out]
+
+        if decode_bits is not None and count is not None:
+            left, right, symbol_idx, symbols = self._build_tree_arrays()
+            buf = np.frombuffer(byte_array, dtype=np.uint8)
+            out = np.empty(count, dtype=np.int32)
+            n = decode_bits(buf, left, right, symbol_idx, padding, out)
+            return np.asarray(symbols, dtype=np.uint32)[out[:n]]
+
+        # Pure-Python fallback (no numba): byte-wise table decode, one dict
+        # lookup per input byte instead of one per bit. There is no
+        # intermediate bit-string representation anywhere on this path — the
+        # old per-byte '{:08b}' formatting pass and its 8x-size string are
+        # gone for good.
+        self._decode_tables = {}
         output = []
-        for bit in bit_string:
-            current_code += bit
-            if current_code in self.reverse_mapping:
-                output.append(self.reverse_mapping[current_code])
-                current_code = ""
-        return output
+        state = ""
+        whole_bytes = len(byte_array) - 1 if padding else len(byte_array)
+        for byte in byte_array[:whole_bytes]:
+            symbols, state = self._decode_table_for(state)[byte]
+            output.extend(symbols)
+        if padding:
+            # The final byte carries padding bits; walk its real bits only.
+            last = byte_array[-1]
+            code = state
+            for i in range(7, padding - 1, -1):
+                code += '1' if (last >> i) & 1 else '0'
+                if code in self.reverse_mapping:
+                    output.append(self.reverse_mapping[code])
+                    code = ""
+        return np.asarray(output, dtype=np.uint32)
 
     # ---------- File Readers ----------
+    # Text-like readers return UTF-8 bytes: the coding alphabet stays
+    # bounded at 256 symbols and all hot-path tables can be dense arrays.
     def _read_text(self):
-        with open(self.file_path, 'r', encoding='utf-8') as f:
+        with open(self.file_path, 'rb') as f:
             return f.read()
 
     def _read_docx(self):
         doc = docx.Document(self.file_path)
-        return "\n".join(para.text for para in doc.paragraphs)
+        return "\n".join(para.text for para in doc.paragraphs).encode('utf-8')
 
     def _read_pdf(self):
         if PyPDF2 is None:
             raise ImportError("Install PyPDF2 to read PDF files.")
         reader = PyPDF2.PdfReader(self.file_path)
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
+        return "\n".join(page.extract_text() or ""
+                         for page in reader.pages).encode('utf-8')
 
     def _read_image(self):
         img = Image.open(self.file_path).convert("RGB")
         array = np.array(img)
-        return array.reshape(-1, 3), array.shape
+        # One uint32 per pixel ((r<<16)|(g<<8)|b): no per-pixel tuples
+        # anywhere downstream, and every stage stays a flat vectorized pass.
+        packed = ((array[..., 0].astype(np.uint32) << 16)
+                  | (array[..., 1].astype(np.uint32) << 8)
+                  | array[..., 2].astype(np.uint32))
+        return packed.reshape(-1), array.shape
 
     # ---------- File Writers ----------
     def _write_text(self, data, out_path):
-        with open(out_path, 'w', encoding='utf-8') as f:
+        with open(out_path, 'wb') as f:
             f.write(data)
 
     def _write_docx(self, data, out_path):
@@ -126,12 +325,34 @@ class HuffmanCoding:
         doc.save(out_path)
 
     def _write_image(self, pixels, shape, out_path):
-        array = np.array(pixels, dtype=np.uint8).reshape(shape)
+        packed = np.asarray(pixels, dtype=np.uint32)
+        array = np.stack([(packed >> 16).astype(np.uint8),
+                          (packed >> 8).astype(np.uint8),
+                          packed.astype(np.uint8)], axis=-1).reshape(shape)
         img = Image.fromarray(array, 'RGB')
         img.save(out_path)
 
+    def _serialize(self, mode, payload, padding=0, count=0, entries=()):
+        type_tag = self.file_type.encode('ascii')
+        shape = getattr(self, 'image_shape', None) or (0, 0, 0)
+        return b''.join([
+            struct.pack('<4sBB', MAGIC, mode, len(type_tag)),
+            type_tag,
+            struct.pack(HEADER_FORMAT, padding, count,
+                        shape[0], shape[1], shape[2], len(entries)),
+            b''.join(struct.pack('<IB', s, l) for s, l in entries),
+            bytes(payload),
+        ])
+
     # ---------- Public Compression ----------
-    def compress(self):
+    def compress_to_bytes(self):
+        if self.file_type in ['jpg', 'jpeg', 'png']:
+            # These containers are already entropy-coded; Huffman over the
+            # decoded raster usually grows the file, so keep the original
+            # bytes untouched.
+            with open(self.file_path, 'rb') as f:
+                return self._serialize(MODE_STORED, f.read())
+
         try:
             if self.file_type == 'txt':
                 data = self._read_text()
@@ -148,24 +369,43 @@ class HuffmanCoding:
             return None
 
         freq_dict = self._build_frequency_dict(data)
-        self._build_heap(freq_dict)
-        self._merge_nodes()
-        self._build_codes()
 
-        encoded_data = self._get_encoded_data(data)
-        padded_data, padding = self._pad_encoded_data(encoded_data)
-        byte_array = self._get_byte_array(padded_data)
+        if self.file_type not in ['jpg', 'jpeg', 'png','bmp']:
+            total = sum(freq_dict.values())
+            entropy = -sum((c / total) * math.log2(c / total)
+                           for c in freq_dict.values())
+            if entropy > STORED_ENTROPY_THRESHOLD:
+                return self._serialize(MODE_STORED, data)
 
-        output_path = self.file_path + ".bin"
+        data_digest = hashlib.blake2b(
+            data if isinstance(data, bytes) else data.tobytes()).digest()
+        self._build_codes(freq_dict, data_digest)
+
+        byte_array, padding = self._get_encoded_data(data)
+        entries = sorted(self.code_lengths.items())
+
+        # The code table alone costs 5 bytes per symbol, so inputs with huge
+        # alphabets — photo-like BMPs with mostly unique colors especially —
+        # can come out larger than they went in. Store those instead.
+        if self.file_type in ['jpg', 'jpeg', 'png','bmp']:
+            with open(self.file_path, 'rb') as f:
+                original = f.read()
+        else:
+            original = data
+        if len(byte_array) + 5 * len(entries) >= len(original):
+            return self._serialize(MODE_STORED, original)
+
+        return self._serialize(MODE_HUFFMAN, byte_array, padding=padding,
+                               count=len(data), entries=entries)
 
+    def compress(self):
+        payload = self.compress_to_bytes()
+        if payload is None:
+            return None
+
+        output_path = self.file_path + ".bin"
         with open(output_path, 'wb') as f:
-            pickle.dump({
-                'bytes': byte_array,
-                'reverse_mapping': self.reverse_mapping,
-                'padding': padding,
-                'type': self.file_type,
-                'shape': getattr(self, 'image_shape', None)
-            }, f)
+            f.write(payload)
 
         print(f"Compressed to: {output_path}")
         return output_path
@@ -174,17 +414,35 @@ class HuffmanCoding:
     def decompress(self):
         try:
             with open(self.file_path, 'rb') as f:
-                data = pickle.load(f)
-
-            self.reverse_mapping = data['reverse_mapping']
-            byte_array = data['bytes']
-            padding = data['padding']
-            file_type = data['type']
-            shape = data.get('shape', None)
-
-            bit_string = ''.join(f"{byte:08b}" for byte in byte_array)
-            bit_string = self._remove_padding(bit_string)
-            decoded = self._decode_data(bit_string)
+                raw = memoryview(f.read())
+
+            magic, mode, type_len = struct.unpack_from('<4sBB', raw, 0)
+            if magic != MAGIC:
+                raise ValueError("Not a recognized compressed file.")
+            offset = struct.calcsize('<4sBB')
+            file_type = bytes(raw[offset:offset + type_len]).decode('ascii')
+            offset += type_len
+            (padding, count, height, width, depth,
+             n_symbols) = struct.unpack_from(HEADER_FORMAT, raw, offset)
+            offset += struct.calcsize(HEADER_FORMAT)
+
+            # View the (symbol, length) table in place; no per-entry
+            # struct.unpack_from calls and no copy of the header bytes.
+            table = np.frombuffer(raw, dtype=np.dtype([('symbol', '<u4'),
+                                                       ('length', 'u1')]),
+                                  count=n_symbols, offset=offset)
+            offset += table.nbytes
+            code_lengths = {int(s): int(l)
+                            for s, l in zip(table['symbol'], table['length'])}
+
+            shape = (height, width, depth) if height else None
+            payload = raw[offset:]  # still a view over the file bytes
+            if mode == MODE_STORED:
+                decoded = payload
+            else:
+                self.code_lengths = code_lengths
+                self.codes, self.reverse_mapping = self._canonical_codes(code_lengths)
+                decoded = self._decode_data(payload, padding, count)
         except Exception as e:
             print(f"Decompression error: {e}")
             return None
@@ -192,10 +450,17 @@ class HuffmanCoding:
         output_path = self.file_path.replace(".bin", f"_decompressed.{file_type}")
 
         try:
-            if file_type in ['txt', 'pdf']:
-                self._write_text("".join(decoded), output_path)
+            if mode == MODE_STORED:
+                if file_type == 'docx':
+                    self._write_docx(bytes(decoded).decode('utf-8'), output_path)
+                else:
+                    with open(output_path, 'wb') as f:
+                        f.write(decoded)
+            elif file_type in ['txt', 'pdf']:
+                self._write_text(decoded.astype(np.uint8).tobytes(), output_path)
             elif file_type == 'docx':
-                self._write_docx("".join(decoded), output_path)
+                self._write_docx(decoded.astype(np.uint8).tobytes().decode('utf-8'),
+                                 output_path)
             elif file_type in ['jpg', 'jpeg', 'png','bmp']:
                 self._write_image(decoded, shape, output_path)
             else:
@@ -206,3 +471,11 @@ class HuffmanCoding:
 
         print(f"Decompressed to: {output_path}")
         return output_path
+
+
+@lru_cache(maxsize=64)
+def _cached_code_lengths(data_digest, freq_items):
+    """Code lengths for a frequency table, keyed on the BLAKE2b digest of
+    the input so repeat uploads of the same content skip the tree build."""
+    lengths = HuffmanCoding._code_lengths_from_frequencies(freq_items)
+    return HuffmanCoding._limit_code_lengths(lengths, MAX_CODE_LENGTH)
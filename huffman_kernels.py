@@ -0,0 +1,79 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None  # huffman.py keeps its pure-Python paths
+
+
+def _pack_bits(idx, code_val, code_len, out):
+    """Pack code_val[idx[i]] (code_len[idx[i]] bits each, MSB first) into out."""
+    register = 0
+    nbits = 0
+    pos = 0
+    for i in range(idx.shape[0]):
+        j = idx[i]
+        register = (register << code_len[j]) | code_val[j]
+        nbits += code_len[j]
+        while nbits >= 8:
+            nbits -= 8
+            out[pos] = (register >> nbits) & 0xff
+            register &= (1 << nbits) - 1
+            pos += 1
+    if nbits > 0:
+        out[pos] = (register << (8 - nbits)) & 0xff
+    return nbits
+
+
+def _decode_bits(byte_array, left, right, symbol, padding, out):
+    """Walk the flattened code tree bit by bit, writing symbol indices to out."""
+    total_bits = byte_array.shape[0] * 8 - padding
+    node = 0
+    count = 0
+    for bit_i in range(total_bits):
+        bit = (byte_array[bit_i >> 3] >> (7 - (bit_i & 7))) & 1
+        node = right[node] if bit else left[node]
+        if symbol[node] >= 0:
+            out[count] = symbol[node]
+            count += 1
+            node = 0
+    return count
+
+
+def _decode_lut(byte_array, lut_symbol, lut_length, lut_bits, out):
+    """Flat-table decode: peek lut_bits, look the code up, consume its length.
+
+    One memory access per output symbol; out must be sized to the exact
+    symbol count. Trailing padding is harmless because the loop is bounded
+    by out.
+    """
+    n_bytes = byte_array.shape[0]
+    mask = (1 << lut_bits) - 1
+    register = 0
+    nbits = 0
+    pos = 0
+    for count in range(out.shape[0]):
+        while nbits < lut_bits and pos < n_bytes:
+            register = (register << 8) | byte_array[pos]
+            pos += 1
+            nbits += 8
+        if nbits >= lut_bits:
+            key = (register >> (nbits - lut_bits)) & mask
+        else:
+            key = (register << (lut_bits - nbits)) & mask
+        out[count] = lut_symbol[key]
+        nbits -= lut_length[key]
+        register &= (1 << nbits) - 1
+    return out.shape[0]
+
+
+if njit is not None:
+    # cache=True persists the compiled code so the one-off JIT cost is not
+    # paid again on every Flask worker start.
+    pack_bits = njit(cache=True)(_pack_bits)
+    decode_bits = njit(cache=True)(_decode_bits)
+    decode_lut = njit(cache=True)(_decode_lut)
+else:
+    pack_bits = None
+    decode_bits = None
+    decode_lut = None